@@ -11,6 +11,7 @@
 # License along with this library. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import mmap
 import shutil
 import logging
 
@@ -540,18 +541,29 @@ class Animation(mutils.Pose):
         Clean up all commands in the exported maya file that are
         not createNode.
         """
-        results = []
+        sentinel = b"select -ne"
 
-        with open(path, "r") as f:
-            for line in f.readlines():
-                if not line.startswith("select -ne"):
-                    results.append(line)
-                else:
-                    results.append("// End")
-                    break
+        with open(path, "r+b") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
 
-        with open(path, "w") as f:
-            f.writelines(results)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if mm[:len(sentinel)] == sentinel:
+                    index = 0
+                else:
+                    index = mm.find(b"\n" + sentinel)
+                    if index != -1:
+                        index += 1
+            finally:
+                mm.close()
+
+            if index == -1:
+                return
+
+            f.seek(index)
+            f.write(b"// End\n")
+            f.truncate()
 
     def _duplicate_node(self, node_path, duplicate_name):
         """Duplicate given node.
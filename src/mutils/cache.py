@@ -11,8 +11,11 @@
 # License along with this library. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import enum
 import shutil
 import logging
+import functools
+import concurrent.futures
 
 from studiovendor.Qt import QtWidgets
 
@@ -21,8 +24,6 @@ import mutils.gui
 
 try:
     import maya.cmds
-    import pymel.core as pmc
-    from mgear.core import dag
 except ImportError:
     import traceback
     traceback.print_exc()
@@ -37,14 +38,30 @@ DEFAULT_FILE_TYPE = "Alembic"
 # A feature flag that will be removed in the future.
 FIX_SAVE_ANIM_REFERENCE_LOCKED_ERROR = True
 
+# The AbcExport job arguments shared by every cache export.
+ABC_EXPORT_ARGS = u"-frameRange {0} {1} -uvWrite -stripNamespaces -dataFormat ogawa "
 
-class PasteOption:
+# The Maya events that invalidate the cached scene units.
+UNIT_CHANGED_EVENTS = ("timeUnitChanged", "linearUnitChanged", "angularUnitChanged")
+
+# The USD attributes kept when exporting a points only cache.
+POINTS_ONLY_ATTRS = ("points", "extent", "xformOpOrder")
+
+
+class PasteOption(str, enum.Enum):
+    """
+    The paste options, which still compare equal to the plain strings
+    used by the attribute and animation modules.
+    """
 
-    Replace = "replace"
     Import = "import"
-    # Replace = "replace"
-    # ReplaceAll = "replace all"
-    # ReplaceCompletely = "replaceCompletely"
+    Insert = "insert"
+    Replace = "replace"
+    ReplaceAll = "replace all"
+    ReplaceCompletely = "replaceCompletely"
+
+    def __str__(self):
+        return self.value
 
 
 class AnimationTransferError(Exception):
@@ -65,7 +82,8 @@ def exportAbc(
         exportUSD=False,
         metadata=None,
         iconPath="",
-        sequencePath=""
+        sequencePath="",
+        pointsOnly=False
 ):
     """
     Save the cache data for the given objects.
@@ -88,6 +106,7 @@ def exportAbc(
     :type sequencePath: str
     :type metadata: dict or None
     :type bakeConnected: bool
+    :type pointsOnly: bool
     
     :rtype: mutils.Animation
     """
@@ -107,11 +126,142 @@ def exportAbc(
         time=time,
         sampleBy=sampleBy,
         fileType=fileType,
-        exportUSD=exportUSD
+        exportUSD=exportUSD,
+        pointsOnly=pointsOnly
     )
     return cache
 
 
+_pmc = None
+_dag = None
+
+
+def _loadPymel():
+    """
+    Import and return the pymel and mgear dag modules.
+
+    Importing pymel can take several seconds, so it is only done the
+    first time it is needed and then kept for the rest of the session.
+
+    :rtype: (module, module)
+    """
+    global _pmc, _dag
+
+    if _pmc is None:
+        import pymel.core
+        from mgear.core import dag
+
+        _pmc = pymel.core
+        _dag = dag
+
+    return _pmc, _dag
+
+
+_unitScriptJobs = []
+
+
+@functools.lru_cache(maxsize=1)
+def _currentUnits():
+    """
+    Return the time, linear and angular unit of the current scene.
+
+    :rtype: (str, str, str)
+    """
+    timeUnit = maya.cmds.currentUnit(q=True, time=True)
+    linearUnit = maya.cmds.currentUnit(q=True, linear=True)
+    angularUnit = maya.cmds.currentUnit(q=True, angle=True)
+
+    return timeUnit, linearUnit, angularUnit
+
+
+def currentUnits():
+    """
+    Return the time, linear and angular unit of the current scene.
+
+    The result is cached while script jobs exist that clear it when a
+    unit changes. If the script jobs cannot be created, for example in
+    a batch session, Maya is queried every time.
+
+    :rtype: (str, str, str)
+    """
+    if not _unitScriptJobs:
+        _currentUnits.cache_clear()
+
+        scriptJobs = []
+        try:
+            for event in UNIT_CHANGED_EVENTS:
+                scriptJob = mutils.ScriptJob(event=[event, _currentUnits.cache_clear])
+                scriptJobs.append(scriptJob)
+        except RuntimeError as error:
+            logger.debug(error)
+            for scriptJob in scriptJobs:
+                scriptJob.kill()
+        else:
+            _unitScriptJobs.extend(scriptJobs)
+
+    return _currentUnits()
+
+
+def removeDescendants(paths):
+    """
+    Return the given long dag paths without duplicates or descendants.
+
+    Example:
+        print(removeDescendants(["|a|b", "|a", "|c", "|a"]))
+        # ['|a', '|c']
+
+    :type paths: list[str]
+    :rtype: list[str]
+    """
+    result = []
+
+    # Sorting by the path components makes sure that a parent always
+    # comes directly before all of its descendants.
+    for path in sorted(set(paths), key=lambda p: p.split("|")):
+        if not result or not path.startswith(result[-1] + "|"):
+            result.append(path)
+
+    return result
+
+
+def overridePointsOnly(path):
+    """
+    Convert the given USD file to a points only override layer.
+
+    All prims are changed from "def" to "over" and every attribute
+    except the points, extent and xform ops are removed.
+
+    :type path: str
+    :rtype: None
+    """
+    # The USD python bindings are only available when the mayaUsd plugin
+    # is installed, so they are only imported when they are needed.
+    try:
+        from pxr import Sdf
+    except ImportError:
+        msg = "Cannot find the USD python bindings (pxr)."
+        raise AnimationTransferError(msg)
+
+    layer = Sdf.Layer.FindOrOpen(path)
+    if layer is None:
+        msg = "Cannot open the USD file: {0}"
+        raise AnimationTransferError(msg.format(path))
+
+    primSpecs = list(layer.rootPrims)
+    while primSpecs:
+        primSpec = primSpecs.pop()
+        primSpec.specifier = Sdf.SpecifierOver
+
+        for attrSpec in list(primSpec.attributes):
+            name = attrSpec.name
+            if name not in POINTS_ONLY_ATTRS and not name.startswith("xformOp:"):
+                primSpec.RemoveProperty(attrSpec)
+
+        primSpecs.extend(primSpec.nameChildren)
+
+    layer.Save()
+
+
 def clampRange(srcTime, dstTime):
     """
     Clips the given source time to within the given destination time.
@@ -206,8 +356,7 @@ def insertKeyframe(curves, time):
     """
     startTime, endTime = time
 
-    for curve in curves:
-        insertStaticKeyframe(curve, time)
+    insertStaticKeyframes(curves, time)
 
     firstFrame = maya.cmds.findKeyframe(curves, time=(startTime, startTime), which='first')
     lastFrame = maya.cmds.findKeyframe(curves, time=(endTime, endTime), which='last')
@@ -227,26 +376,56 @@ def insertStaticKeyframe(curve, time):
     :type time: (int, int)
     :rtype: None
     """
-    startTime, endTime = time
+    insertStaticKeyframes([curve], time)
 
-    lastFrame = maya.cmds.findKeyframe(curve, which='last')
-    firstFrame = maya.cmds.findKeyframe(curve, which='first')
 
-    if firstFrame == lastFrame:
-        maya.cmds.setKeyframe(curve, insert=True, time=(startTime, endTime))
-        maya.cmds.keyTangent(curve, time=(startTime, startTime), ott="step")
+def insertStaticKeyframes(curves, time):
+    """
+    Insert a static keyframe on the given curves at the given time.
+
+    Curves that share the same first and last keyframe are keyed
+    together, so the number of Maya commands scales with the number
+    of distinct key ranges rather than the number of curves.
 
-    if startTime < firstFrame:
-        nextFrame = maya.cmds.findKeyframe(curve, time=(startTime, startTime), which='next')
-        if startTime < nextFrame < endTime:
-            maya.cmds.setKeyframe(curve, insert=True, time=(startTime, nextFrame))
-            maya.cmds.keyTangent(curve, time=(startTime, startTime), ott="step")
+    :type curves: list[str]
+    :type time: (int, int)
+    :rtype: None
+    """
+    startTime, endTime = time
 
-    if endTime > lastFrame:
-        previousFrame = maya.cmds.findKeyframe(curve, time=(endTime, endTime), which='previous')
-        if startTime < previousFrame < endTime:
-            maya.cmds.setKeyframe(curve, insert=True, time=(previousFrame, endTime))
-            maya.cmds.keyTangent(curve, time=(previousFrame, previousFrame), ott="step")
+    groups = {}
+    for curve in curves:
+        times = maya.cmds.keyframe(curve, query=True, timeChange=True)
+        if times:
+            groups.setdefault((times[0], times[-1]), []).append(curve)
+
+    for (firstFrame, lastFrame), group in groups.items():
+
+        isStatic = firstFrame == lastFrame
+
+        if isStatic:
+            maya.cmds.setKeyframe(group, insert=True, time=(startTime, endTime))
+            maya.cmds.keyTangent(group, time=(startTime, startTime), ott="step")
+
+        # There are no keys before the first or after the last keyframe,
+        # so the next and previous keyframe are known unless new keys
+        # were just inserted on a static curve. Every curve in a static
+        # group has the same keys, so one query covers the whole group.
+        if startTime < firstFrame:
+            nextFrame = firstFrame
+            if isStatic:
+                nextFrame = maya.cmds.findKeyframe(group, time=(startTime, startTime), which='next')
+            if startTime < nextFrame < endTime:
+                maya.cmds.setKeyframe(group, insert=True, time=(startTime, nextFrame))
+                maya.cmds.keyTangent(group, time=(startTime, startTime), ott="step")
+
+        if endTime > lastFrame:
+            previousFrame = lastFrame
+            if isStatic:
+                previousFrame = maya.cmds.findKeyframe(group, time=(endTime, endTime), which='previous')
+            if startTime < previousFrame < endTime:
+                maya.cmds.setKeyframe(group, insert=True, time=(previousFrame, endTime))
+                maya.cmds.keyTangent(group, time=(previousFrame, previousFrame), ott="step")
 
 
 def importAbc(
@@ -255,6 +434,7 @@ def importAbc(
     objects=None,
     option=None,
     namespaces=None,
+    startFrame=None,
     showDialog=False,
 ):
     """
@@ -273,7 +453,9 @@ def importAbc(
     if spacing < 1:
         spacing = 1
 
-    if option is None or option == "replace all":
+    option = PasteOption(option or PasteOption.ReplaceCompletely)
+
+    if option is PasteOption.ReplaceAll:
         option = PasteOption.ReplaceCompletely
 
     if showDialog:
@@ -296,25 +478,49 @@ def importAbc(
         if not accepted:
             raise Exception("Dialog canceled!")
 
+    # The caches are created on the main thread, because Maya commands
+    # are not thread safe, and only the pose.json files are read by the
+    # worker threads while the previous cache is loaded.
+    caches = []
     for path in paths:
+        cache = mutils.Cache()
+        cache.setPath(path)
+        caches.append(cache)
 
-        cache = mutils.Cache.fromPath(path)
+    maxWorkers = max(1, min(8, len(caches)))
 
-        if startFrame is None and isFirstAnim:
-            startFrame = cache.startFrame()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
 
-        if option == "replaceCompletely" and not isFirstAnim:
-            option = "insert"
+        futures = [executor.submit(cache.read) for cache in caches]
 
-        cache.load(
-            option=option,
-            objects=objects,
-            namespaces=namespaces,
-        )
+        try:
+            for cache, future in zip(caches, futures):
+
+                future.result()
+
+                cacheStartFrame = cache.startFrame()
+                cacheEndFrame = cache.endFrame()
+
+                if startFrame is None and isFirstAnim:
+                    startFrame = cacheStartFrame
+
+                if option is PasteOption.ReplaceCompletely and not isFirstAnim:
+                    option = PasteOption.Insert
 
-        duration = cache.endFrame() - cache.startFrame()
-        startFrame += duration + spacing
-        isFirstAnim = False
+                cache.load(
+                    option=option,
+                    objects=objects,
+                    namespaces=namespaces,
+                )
+
+                duration = cacheEndFrame - cacheStartFrame
+                startFrame += duration + spacing
+                isFirstAnim = False
+        except BaseException:
+            # Don't wait for the reads that will never be used
+            for future in futures:
+                future.cancel()
+            raise
 
 # def connect_meta(objects=None,
 # ):
@@ -348,10 +554,10 @@ class Cache(mutils.Pose):
     def __init__(self):
         mutils.Pose.__init__(self)
 
+        self._entries = None
+
         try:
-            timeUnit = maya.cmds.currentUnit(q=True, time=True)
-            linearUnit = maya.cmds.currentUnit(q=True, linear=True)
-            angularUnit = maya.cmds.currentUnit(q=True, angle=True)
+            timeUnit, linearUnit, angularUnit = currentUnits()
 
             self.setMetadata("timeUnit", timeUnit)
             self.setMetadata("linearUnit", linearUnit)
@@ -386,14 +592,37 @@ class Cache(mutils.Pose):
         """
         return self.metadata().get("endFrame")
 
+    def setPath(self, path):
+        """
+        Set the disc location and clear the cached directory entries.
+
+        :type path: str
+        """
+        mutils.Pose.setPath(self, path)
+        self._entries = None
+
+    def entries(self):
+        """
+        Return the names of the files in the cache directory.
+
+        The directory is only scanned once per path.
+
+        :rtype: set[str]
+        """
+        if self._entries is None:
+            try:
+                self._entries = {entry.name for entry in os.scandir(self.path())}
+            except OSError:
+                self._entries = set()
+        return self._entries
+
     def mayaPath(self):
         """
         :rtype: str
         """
-        mayaPath = os.path.join(self.path(), "animation.mb")
-        if not os.path.exists(mayaPath):
-            mayaPath = os.path.join(self.path(), "animation.ma")
-        return mayaPath
+        if "animation.mb" in self.entries():
+            return os.path.join(self.path(), "animation.mb")
+        return os.path.join(self.path(), "animation.ma")
 
     def poseJsonPath(self):
         """
@@ -408,10 +637,13 @@ class Cache(mutils.Pose):
         :rtype: list[str]
         """
         result = []
-        if os.path.exists(self.mayaPath()):
-            result.append(self.mayaPath())
+        entries = self.entries()
 
-        if os.path.exists(self.poseJsonPath()):
+        mayaPath = self.mayaPath()
+        if os.path.basename(mayaPath) in entries:
+            result.append(mayaPath)
+
+        if "pose.json" in entries:
             result.append(self.poseJsonPath())
 
         return result
@@ -439,9 +671,8 @@ class Cache(mutils.Pose):
         :type attr: str
         :type curve: str
         """
-        self.objects()[name].setdefault("attrs", {})
-        self.objects()[name]["attrs"].setdefault(attr, {})
-        self.objects()[name]["attrs"][attr]["curve"] = curve
+        attrs = self.objects()[name].setdefault("attrs", {})
+        attrs.setdefault(attr, {})["curve"] = curve
 
     def read(self, path=None):
         """
@@ -457,7 +688,7 @@ class Cache(mutils.Pose):
 
     def isAscii(self, s):
         """Check if the given string is a valid ascii string."""
-        return all(ord(c) < 128 for c in s)
+        return s.isascii()
 
     @mutils.unifyUndo
     @mutils.restoreSelection
@@ -489,6 +720,10 @@ class Cache(mutils.Pose):
         Clean up all imported nodes, as well as the namespace.
         Should be called in a finally block.
         """
+        # Nothing has been imported if the namespace doesn't exist.
+        if not maya.cmds.namespace(exists=Cache.IMPORT_NAMESPACE):
+            return
+
         nodes = maya.cmds.ls(Cache.IMPORT_NAMESPACE + ":*", r=True) or []
         if nodes:
             maya.cmds.delete(nodes)
@@ -496,11 +731,8 @@ class Cache(mutils.Pose):
         # It is important that we remove the imported namespace,
         # otherwise another namespace will be created on next
         # animation open.
-        namespaces = maya.cmds.namespaceInfo(ls=True) or []
-
-        if Cache.IMPORT_NAMESPACE in namespaces:
-            maya.cmds.namespace(set=':')
-            maya.cmds.namespace(rm=Cache.IMPORT_NAMESPACE)
+        maya.cmds.namespace(set=':')
+        maya.cmds.namespace(rm=Cache.IMPORT_NAMESPACE)
 
 
     @mutils.timing
@@ -513,7 +745,8 @@ class Cache(mutils.Pose):
         time=None,
         sampleBy=1,
         fileType="Alembic",
-        exportUSD=False
+        exportUSD=False,
+        pointsOnly=False
     ):
         """
         Save all animation data from the objects set on the Anim object.
@@ -522,7 +755,9 @@ class Cache(mutils.Pose):
         :type time: (int, int) or None
         :type sampleBy: int
         :type fileType: str
-        
+        :type exportUSD: bool
+        :type pointsOnly: bool
+
         :rtype: None
         """
         objects = list(self.objects().keys())
@@ -556,34 +791,48 @@ class Cache(mutils.Pose):
             fileName = "cache.abc"
 
         mayaPath = os.path.join(path, fileName)
+        # ls silently drops missing objects, which would either leave them
+        # out of the export or export the whole scene when none are found.
+        missing = [obj for obj in objects if not maya.cmds.objExists(obj)]
+        if missing:
+            msg = "Cannot find the following objects: {0}"
+            raise AnimationTransferError(msg.format(", ".join(missing)))
+
+        # AbcExport would export a root that is below another root twice
+        roots = removeDescendants(maya.cmds.ls(objects, long=True) or [])
+        if not roots:
+            msg = "No objects to export!"
+            raise AnimationTransferError(msg)
+
         posePath = os.path.join(path, "pose.json")
         mutils.Pose.save(self, posePath)
 
-        root_to_objects = []
-
-        for object in objects:
-            maya.cmds.ls(object, long=True)
-            root_to_objects.append("-root " + object)
-
-        root_to_objects = " ".join(root_to_objects)
-
-        command = u"-frameRange {0} {1} -uvWrite -stripNamespaces -dataFormat ogawa {2} -file {3}"
-        command = command.format(start, end, root_to_objects, mayaPath)
-        maya.cmds.AbcExport ( j = command )
+        command = ABC_EXPORT_ARGS.format(start, end)
+        command += " ".join("-root " + root for root in roots)
+        command += " -file " + mayaPath
+        maya.cmds.AbcExport(j=command)
 
         try:
             if exportUSD:
                 logger.info("Exporting USD")
                 exportList = []
-                for selection in pmc.selected():
-                    topnode = dag.getTopParent(selection)
-                    if topnode.hasAttr("is_crowd"):
+                topnodes = set()
+                for selection in maya.cmds.ls(sl=True, long=True) or []:
+                    # The top parent is the first component of the long name
+                    if not selection.startswith("|"):
+                        continue
+                    topnode = "|" + selection.split("|", 2)[1]
+                    if topnode in topnodes:
+                        continue
+                    topnodes.add(topnode)
+                    if maya.cmds.attributeQuery("is_crowd", node=topnode, exists=True):
                         exportList.append(topnode)
                 if exportList:
-                    logger.info(mayaPath.replace(".abc", ".usdc"))
+                    usdPath = mayaPath.replace(".abc", ".usdc")
+                    logger.info(usdPath)
                     maya.cmds.mayaUSDExport(
                         exportList,
-                        file=mayaPath.replace(".abc", ".usdc"),
+                        file=usdPath,
                         frameRange=[start, end],
                         frameStride=1.0,
                         convertMaterialsTo="None",
@@ -602,6 +851,8 @@ class Cache(mutils.Pose):
                         eulerFilter=1,
                         staticSingleSample=1
                     )
+                    if pointsOnly:
+                        overridePointsOnly(usdPath)
                 else:
                     logger.warning("USD not exported.")
         except:
@@ -625,6 +876,11 @@ class Cache(mutils.Pose):
         """
         logger.info(u'Loading: {0}'.format(self.path()))
 
+        # The cache is always loaded onto the model of the first namespace
+        if not namespaces:
+            msg = "Please specify a namespace to load the cache onto!"
+            raise AnimationTransferError(msg)
+
         self.validate(namespaces=namespaces)
 
         objects = maya.cmds.listRelatives("{}:model".format(namespaces[0]), children=True)
@@ -633,14 +889,9 @@ class Cache(mutils.Pose):
         mayaPath = os.path.join(self.path(), fileName)
 
         if objects:
-            logger.debug("Cache.load(objects=%s, option=%s, namespaces=%s" %
-                    (len(objects), str(option), str(namespaces)))
-            root_to_objects = []
-            for object in objects:
-                maya.cmds.ls(object, long=True)
-                root_to_objects.append("-root " + object)
-
-            objects = " ".join(root_to_objects)
+            logger.debug("Cache.load(objects=%s, option=%s, namespaces=%s)",
+                         len(objects), option, namespaces)
+            objects = " ".join("-root " + object for object in objects)
             
             alembic_name = maya.cmds.AbcImport(mayaPath, mode="import", connect=objects)
         else:
@@ -648,6 +899,7 @@ class Cache(mutils.Pose):
             alembic_name = maya.cmds.AbcImport(mayaPath, mode="import", reparent=model)
         
         # connect alembic node attrs to top asset node meta data attrs
+        pmc, dag = _loadPymel()
         topnode = dag.getTopParent(pmc.PyNode(namespaces[0]+":model"))
         if topnode.hasAttr("is_crowd"):
             attrs = (("cycle_name", "abc_File"), ("cycle_length","endFrame"), ("cycle_offset","offset"))
@@ -10,8 +10,12 @@
 # You should have received a copy of the GNU Lesser General Public
 # License along with this library. If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import shutil
+import tempfile
 import unittest
 
+import mutils.cache
 import mutils.animation
 
 
@@ -45,6 +49,73 @@ class TestUtils(unittest.TestCase):
             clampRange = mutils.animation.clampRange((65, 95), (20, 30))
         self.assertRaises(mutils.animation.OutOfBoundsError, test_exception)
 
+    def test_remove_descendants(self):
+        """
+        Test removing duplicate and nested dag paths
+        """
+        removeDescendants = mutils.cache.removeDescendants
+
+        # Test duplicates
+        result = removeDescendants(["|a", "|b", "|a"])
+        assert ["|a", "|b"] == result, "Duplicates were not removed"
+
+        # Test nested paths
+        result = removeDescendants(["|a|b|c", "|a|b", "|a", "|c|d"])
+        assert ["|a", "|c|d"] == result, "Descendants were not removed"
+
+        # Test sibling paths that share a prefix
+        result = removeDescendants(["|a_b", "|a|b", "|a-x", "|a", "|a_b|c"])
+        assert ["|a", "|a-x", "|a_b"] == sorted(result), "Siblings were removed"
+
+        # Test empty
+        assert [] == removeDescendants([]), "Expected an empty list"
+
+    def cleanMayaFile(self, data):
+        """
+        Return the contents of a maya file after cleaning the given data.
+
+        :type data: bytes
+        :rtype: bytes
+        """
+        tempDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempDir, "animation.ma")
+
+            with open(path, "wb") as f:
+                f.write(data)
+
+            mutils.animation.Animation().cleanMayaFile(path)
+
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_clean_maya_file(self):
+        """
+        Test truncating the maya file at the first select command
+        """
+        # Test truncating after the createNode commands
+        data = b"createNode a;\ncreateNode b;\nselect -ne :time1;\nsetAttr x;\n"
+        result = self.cleanMayaFile(data)
+        assert b"createNode a;\ncreateNode b;\n// End\n" == result, "Incorrect truncation"
+
+        # Test the select command on the first line
+        result = self.cleanMayaFile(b"select -ne :time1;\ncreateNode a;\n")
+        assert b"// End\n" == result, "Incorrect truncation on the first line"
+
+        # Test a file without a select command is not changed
+        data = b"createNode a;\ncreateNode b;\n"
+        assert data == self.cleanMayaFile(data), "File without select was changed"
+
+        # Test an empty file
+        assert b"" == self.cleanMayaFile(b""), "Empty file was changed"
+
+        # Test windows line endings
+        data = b"createNode a;\r\nselect -ne :time1;\r\nsetAttr x;\r\n"
+        result = self.cleanMayaFile(data)
+        assert b"createNode a;\r\n// End\n" == result, "Incorrect CRLF truncation"
+
 
 def testSuite():
     """
@@ -43,6 +43,13 @@ except Exception:
     import traceback
     traceback.print_exc()
 
+# Use orjson for parsing if it is installed, since it is much faster
+# than the built-in json module for large animation files.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +90,16 @@ class TransferObject(object):
         :type path: str
         :rtype: dict
         """
+        if orjson:
+            with open(path, "rb") as f:
+                data = f.read() or b"{}"
+
+            # orjson rejects the NaN and Infinity values written by json.dumps
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                return json.loads(data)
+
         with open(path, "r") as f:
             data = f.read() or "{}"
 
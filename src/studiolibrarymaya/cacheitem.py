@@ -15,6 +15,7 @@ NOTE: Make sure you register this item in the config.
 
 import os
 import logging
+import functools
 
 from studiolibrarymaya import baseitem
 
@@ -28,6 +29,25 @@ except ImportError as error:
 
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=512)
+def _readCacheMetadata(path, mtime):
+    """
+    Return the start and end frame from the given pose.json path.
+
+    The mtime is only used as part of the cache key so that the
+    result is invalidated when the file changes on disc.
+
+    :type path: str
+    :type mtime: float
+    :rtype: (int or None, int or None)
+    """
+    data = mutils.TransferObject.readJson(path)
+    metadata = data.get("metadata", {})
+
+    return metadata.get("startFrame"), metadata.get("endFrame")
+
+
 def save(path, *args, **kwargs):
     """Convenience function for saving an AnimItem."""
     CacheItem(path).safeSave(*args, **kwargs)
@@ -61,10 +81,11 @@ class CacheItem(baseitem.BaseItem):
         """
         schema = super(CacheItem, self).loadSchema()
 
-        cache = mutils.Cache.fromPath(self.path())
+        path = os.path.join(self.path(), "pose.json")
+        startFrame, endFrame = _readCacheMetadata(path, os.path.getmtime(path))
 
-        startFrame = cache.startFrame() or 0
-        endFrame = cache.endFrame() or 0
+        startFrame = startFrame or 0
+        endFrame = endFrame or 0
 
         value = "{0} - {1}".format(startFrame, endFrame)
         schema.insert(3, {"name": "Range", "value": value})
@@ -133,6 +154,15 @@ class CacheItem(baseitem.BaseItem):
                 "inline": True,
                 "label": {"visible": False}
             },
+            {
+                "name": "pointsOnly",
+                "type": "bool",
+                "default": False,
+                "persistent": True,
+                "inline": True,
+                "label": {"visible": False},
+                "toolTip": "Only used when exporting USD.",
+            },
             {
                 "name": "frameRange",
                 "type": "range",
@@ -188,6 +218,12 @@ class CacheItem(baseitem.BaseItem):
                 }
             ])
 
+        # The points only option only applies to the USD export
+        fields.append({
+            "name": "pointsOnly",
+            "enabled": bool(kwargs.get("exportUSD")),
+        })
+
         # Validate the frame range field
         start, end = kwargs.get("frameRange", (0, 1))
         if start >= end:
@@ -220,5 +256,6 @@ class CacheItem(baseitem.BaseItem):
             iconPath=kwargs.get("thumbnail"),
             metadata={"description": kwargs.get("comment", "")},
             sequencePath=sequencePath,
-            exportUSD=kwargs.get("exportUSD")
+            exportUSD=kwargs.get("exportUSD"),
+            pointsOnly=bool(kwargs.get("exportUSD") and kwargs.get("pointsOnly"))
         )